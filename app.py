@@ -1,18 +1,37 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, g, session, abort
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
+from statistics import median
+from zoneinfo import ZoneInfo
 import os
+import click
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///tkd_transport.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['TIMEZONE'] = os.environ.get('TIMEZONE', 'Asia/Seoul')  # 탑승 시각 기록/표시 기준 시간대
+app.config['DEFAULT_DOJO'] = os.environ.get('DEFAULT_DOJO', 'main')  # 도장 지정이 없을 때 사용할 도장
+app.config['DOJO_BASE_DOMAIN'] = os.environ.get('DOJO_BASE_DOMAIN')  # 서브도메인 라우팅용 (예: tkd-car.com)
 
 db = SQLAlchemy(app)
 
 # 데이터베이스 모델
+class Dojo(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(50), unique=True, nullable=False)  # 서브도메인/경로에 쓰는 도장 식별자
+    name = db.Column(db.String(100), nullable=False)
+    eta_version = db.Column(db.Integer, nullable=False, default=0)  # 탑승/장소 변경 시 증가 (워커 간 ETA 캐시 갱신용)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Student(db.Model):
+    __table_args__ = (
+        db.Index('ix_student_dojo_name', 'dojo_id', 'name'),
+        db.Index('ix_student_dojo_location', 'dojo_id', 'pickup_location'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
+    dojo_id = db.Column(db.Integer, db.ForeignKey('dojo.id'), nullable=False)
     name = db.Column(db.String(50), nullable=False)
     grade = db.Column(db.String(20))
     phone = db.Column(db.String(20))
@@ -24,7 +43,13 @@ class Student(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Schedule(db.Model):
+    __table_args__ = (
+        db.Index('ix_schedule_dojo_day', 'dojo_id', 'day_of_week', 'pickup_time'),
+        db.Index('ix_schedule_dojo_student', 'dojo_id', 'student_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
+    dojo_id = db.Column(db.Integer, db.ForeignKey('dojo.id'), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     day_of_week = db.Column(db.Integer, nullable=False)  # 0=월요일, 6=일요일
     pickup_time = db.Column(db.Time, nullable=False)
@@ -33,7 +58,12 @@ class Schedule(db.Model):
     student = db.relationship('Student', backref=db.backref('schedules', lazy=True))
 
 class Request(db.Model):
+    __table_args__ = (
+        db.Index('ix_request_dojo_student', 'dojo_id', 'student_id', 'start_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
+    dojo_id = db.Column(db.Integer, db.ForeignKey('dojo.id'), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     request_type = db.Column(db.String(20), nullable=False)  # 'absence', 'pickup_skip', 'dropoff_skip'
     reason = db.Column(db.String(100))
@@ -46,7 +76,13 @@ class Request(db.Model):
     student = db.relationship('Student', backref=db.backref('requests', lazy=True))
 
 class Attendance(db.Model):
+    __table_args__ = (
+        db.Index('ix_attendance_dojo_date', 'dojo_id', 'date', 'student_id'),
+        db.Index('ix_attendance_dojo_student', 'dojo_id', 'student_id', 'date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
+    dojo_id = db.Column(db.Integer, db.ForeignKey('dojo.id'), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     pickup_time = db.Column(db.Time)
@@ -57,6 +93,242 @@ class Attendance(db.Model):
     
     student = db.relationship('Student', backref=db.backref('attendances', lazy=True))
 
+# 도장(테넌트) 처리
+class DojoPathMiddleware:
+    """/d/<도장>/... 경로를 떼어내 SCRIPT_NAME으로 옮김 (url_for가 도장 경로를 유지)"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        parts = environ.get('PATH_INFO', '').split('/', 3)
+        if len(parts) >= 3 and parts[1] == 'd' and parts[2]:
+            environ['tkd.dojo_slug'] = parts[2]
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + f"/d/{parts[2]}"
+            environ['PATH_INFO'] = '/' + (parts[3] if len(parts) > 3 else '')
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = DojoPathMiddleware(app.wsgi_app)
+
+dojo_ids = {}  # slug -> 도장 id (프로세스 캐시)
+
+def find_dojo_id(slug):
+    if slug not in dojo_ids:
+        dojo = Dojo.query.filter_by(slug=slug).first()
+        if not dojo:
+            return None
+        dojo_ids[slug] = dojo.id
+    return dojo_ids[slug]
+
+def subdomain_slug():
+    base_domain = app.config['DOJO_BASE_DOMAIN']
+    if not base_domain:
+        return None
+    host = request.host.split(':')[0].lower()
+    if host.endswith('.' + base_domain):
+        slug = host[:-len(base_domain) - 1].split('.')[-1]
+        if slug != 'www':
+            return slug
+    return None
+
+@app.before_request
+def load_dojo():
+    # 서브도메인 → 경로(/d/<도장>) → 기본 도장 순으로 도장 결정
+    if request.endpoint == 'static':
+        return
+    
+    slug = subdomain_slug() or request.environ.get('tkd.dojo_slug')
+    if slug:
+        dojo_id = find_dojo_id(slug)
+        if dojo_id is None:
+            abort(404)
+        if session.get('dojo_slug') != slug:
+            session['dojo_slug'] = slug
+        g.dojo_id = dojo_id
+        return
+    
+    # 경로 없이 들어온 GET은 마지막 방문 도장 경로로 이동 (화면과 API 호출이 같은 도장을 쓰도록)
+    # 데이터 변경 요청은 세션으로 도장을 고르지 않음
+    last_slug = session.get('dojo_slug')
+    if request.method == 'GET' and last_slug and last_slug != app.config['DEFAULT_DOJO']:
+        if find_dojo_id(last_slug) is not None:
+            query_string = request.query_string.decode()
+            return redirect(f"{request.script_root}/d/{last_slug}{request.path}" + (f"?{query_string}" if query_string else ''))
+        session.pop('dojo_slug', None)
+    g.dojo_id = find_dojo_id(app.config['DEFAULT_DOJO'])
+
+def scoped(model):
+    # 현재 도장의 데이터만 조회
+    return model.query.filter_by(dojo_id=g.dojo_id)
+
+# 픽업 예상 시간(ETA) 엔진
+ETA_WINDOW = 10  # 최근 몇 번의 탑승 기록으로 중앙값을 낼지
+ETA_HISTORY_DAYS = 90  # 처음 로딩할 때 조회할 출석 기록 기간
+ETA_MIN_SAMPLES = 2  # 학생별 예측에 필요한 최소 탑승 기록 수
+
+def local_now():
+    # 서버 시간대(Render는 UTC)와 관계없이 도장 현지 시각 사용
+    return datetime.now(ZoneInfo(app.config['TIMEZONE'])).replace(tzinfo=None)
+
+def time_to_minutes(value):
+    return value.hour * 60 + value.minute
+
+def parse_12h_time(text):
+    # 수기 입력된 12시간제 시간('2:40')을 분 단위로 변환 (오후 기준)
+    try:
+        hour, minute = [int(part) for part in text.strip().split(':')]
+    except (AttributeError, ValueError):
+        return None
+    if hour < 12:
+        hour += 12
+    return hour * 60 + minute
+
+def format_12h(minutes):
+    # 분 단위 시간을 12시간제 문자열로 변환 (PM 제거)
+    hour, minute = divmod(int(round(minutes)), 60)
+    if hour == 0 or hour == 12:
+        return f"12:{minute:02d}"
+    if hour < 12:
+        return f"{hour}:{minute:02d}"
+    return f"{hour-12}:{minute:02d}"
+
+class PickupEtaEngine:
+    """실제 탑승 시각 기록으로 학생별/장소별 픽업 예상 시간을 계산 (도장별 인스턴스)"""
+
+    def __init__(self, dojo_id):
+        self.dojo_id = dojo_id
+        self.loaded_on = None
+        self.version = None  # 로딩 시점의 Dojo.eta_version
+        self.student_samples = {}  # (학생 id, 요일, 부) -> {날짜: 탑승 시각(분)}
+        self.location_samples = {}  # (장소, 요일, 부) -> {(날짜, 학생 id): 탑승 시각(분)}
+        self.median_cache = {}
+
+    def ensure_loaded(self):
+        # 하루에 한 번, 또는 다른 워커가 기록을 바꿨을 때만 출석 기록 전체를 일괄 조회해서 버킷을 만든다
+        today_date = local_now().date()
+        version = dojo_eta_version(self.dojo_id)
+        if self.loaded_on == today_date and self.version == version:
+            return
+        
+        self.student_samples = {}
+        self.location_samples = {}
+        self.median_cache = {}
+        
+        rows = db.session.query(
+            Attendance.student_id, Attendance.date, Attendance.pickup_time,
+            Student.pickup_location, Student.session_part
+        ).join(Student).filter(
+            Attendance.dojo_id == self.dojo_id,
+            Attendance.pickup_status == 'boarded',
+            Attendance.pickup_time.isnot(None),
+            Attendance.date >= today_date - timedelta(days=ETA_HISTORY_DAYS)
+        ).all()
+        
+        for student_id, attendance_date, pickup_time, location, part in rows:
+            self._add(student_id, location, part, attendance_date, time_to_minutes(pickup_time))
+        
+        self.loaded_on = today_date
+        self.version = version
+
+    def apply(self, version):
+        # 이 워커의 변경만 있었으면(버전 +1) 증분 갱신, 아니면 다음 조회 때 다시 로딩
+        if self.loaded_on is None or version != self.version + 1:
+            self.loaded_on = None
+            return False
+        self.version = version
+        return True
+
+    def record(self, student, attendance_date, pickup_time):
+        # 탑승 체크/취소 시 해당 버킷만 갱신 (아직 로딩 전이면 다음 조회 때 DB에서 읽음)
+        if self.loaded_on is None:
+            return
+        
+        if pickup_time is None:
+            self._remove(student.id, student.pickup_location, student.session_part, attendance_date)
+        else:
+            self._add(student.id, student.pickup_location, student.session_part,
+                      attendance_date, time_to_minutes(pickup_time))
+
+    def reset(self):
+        # 학생 장소/부 변경 시 버킷 키가 달라지므로 다음 조회 때 다시 로딩
+        self.loaded_on = None
+        self.student_samples = {}
+        self.location_samples = {}
+        self.median_cache = {}
+
+    def forget(self, student_id):
+        for key in [key for key in self.student_samples if key[0] == student_id]:
+            del self.student_samples[key]
+        for key, samples in self.location_samples.items():
+            for sample_key in [sample_key for sample_key in samples if sample_key[1] == student_id]:
+                del samples[sample_key]
+        self.median_cache = {}
+
+    def _add(self, student_id, location, part, attendance_date, minutes):
+        weekday = attendance_date.weekday()
+        student_key = (student_id, weekday, part)
+        self.student_samples.setdefault(student_key, {})[attendance_date] = minutes
+        self.median_cache.pop(('student', student_key), None)
+        
+        if location:
+            location_key = (location, weekday, part)
+            self.location_samples.setdefault(location_key, {})[(attendance_date, student_id)] = minutes
+            self.median_cache.pop(('location', location_key), None)
+
+    def _remove(self, student_id, location, part, attendance_date):
+        weekday = attendance_date.weekday()
+        student_key = (student_id, weekday, part)
+        self.student_samples.get(student_key, {}).pop(attendance_date, None)
+        self.median_cache.pop(('student', student_key), None)
+        
+        if location:
+            location_key = (location, weekday, part)
+            self.location_samples.get(location_key, {}).pop((attendance_date, student_id), None)
+            self.median_cache.pop(('location', location_key), None)
+
+    def _student_median(self, student_key):
+        cache_key = ('student', student_key)
+        if cache_key not in self.median_cache:
+            samples = self.student_samples.get(student_key, {})
+            recent = [samples[d] for d in sorted(samples)[-ETA_WINDOW:]]
+            self.median_cache[cache_key] = median(recent) if len(recent) >= ETA_MIN_SAMPLES else None
+        return self.median_cache[cache_key]
+
+    def _location_median(self, location_key):
+        cache_key = ('location', location_key)
+        if cache_key not in self.median_cache:
+            samples = self.location_samples.get(location_key, {})
+            recent_dates = set(sorted({d for d, _ in samples})[-ETA_WINDOW:])
+            recent = [minutes for (d, _), minutes in samples.items() if d in recent_dates]
+            self.median_cache[cache_key] = median(recent) if recent else None
+        return self.median_cache[cache_key]
+
+    def predict_student(self, student, weekday):
+        # 학생 기록 → 장소 기록 → 수기 입력 시간 순으로 예측 (분 단위, 없으면 None)
+        prediction = self._student_median((student.id, weekday, student.session_part))
+        if prediction is None and student.pickup_location:
+            prediction = self._location_median((student.pickup_location, weekday, student.session_part))
+        if prediction is None and student.estimated_pickup_time:
+            prediction = parse_12h_time(student.estimated_pickup_time)
+        return prediction
+
+    def predict_location(self, location, weekday, part):
+        return self._location_median((location, weekday, part))
+
+eta_engines = {}  # 도장 id -> PickupEtaEngine (워커별 캐시, Dojo.eta_version으로 동기화)
+
+def get_eta_engine(dojo_id):
+    if dojo_id not in eta_engines:
+        eta_engines[dojo_id] = PickupEtaEngine(dojo_id)
+    return eta_engines[dojo_id]
+
+def dojo_eta_version(dojo_id):
+    return db.session.query(Dojo.eta_version).filter_by(id=dojo_id).scalar()
+
+def bump_eta_version(dojo_id):
+    # 커밋 전에 호출 → 다른 워커는 다음 조회 때 ETA 캐시를 다시 로딩
+    Dojo.query.filter_by(id=dojo_id).update({Dojo.eta_version: Dojo.eta_version + 1})
+
 # 라우트
 @app.route('/')
 def index():
@@ -64,13 +336,48 @@ def index():
 
 @app.route('/today')
 def today():
-    today_date = date.today()
+    today_date = local_now().date()
     day_of_week = today_date.weekday()
     
     # 오늘 스케줄이 있는 학생들 조회 (시간 순서대로 정렬)
     students_with_schedule = db.session.query(Student, Schedule).join(Schedule).filter(
+        Schedule.dojo_id == g.dojo_id,
         Schedule.day_of_week == day_of_week
-    ).order_by(Schedule.pickup_time, Student.pickup_location, Student.estimated_pickup_time).all()
+    ).order_by(Schedule.pickup_time, Student.pickup_location, Student.name).all()
+    
+    # 실제 탑승 기록 기반 예상 시간 계산 (이력은 엔진에 캐시되어 있음)
+    eta_engine = get_eta_engine(g.dojo_id)
+    eta_engine.ensure_loaded()
+    student_etas = {}
+    earliest_etas = {}
+    for student, schedule in students_with_schedule:
+        student_eta = eta_engine.predict_student(student, day_of_week)
+        student_etas[student.id] = student_eta
+        location_key = (student.pickup_location, student.session_part)
+        if student_eta is not None:
+            earliest_etas[location_key] = min(earliest_etas.get(location_key, student_eta), student_eta)
+    
+    # 장소 기록이 없으면 해당 장소 학생들 중 가장 이른 예상 시간 사용
+    location_etas = {}
+    for student, schedule in students_with_schedule:
+        location_key = (student.pickup_location, student.session_part)
+        if location_key not in location_etas:
+            location_eta = None
+            if student.pickup_location:
+                location_eta = eta_engine.predict_location(student.pickup_location, day_of_week, student.session_part)
+            location_etas[location_key] = location_eta if location_eta is not None else earliest_etas.get(location_key)
+    
+    # 같은 시간대 안에서 장소 예상 시간 → 학생 예상 시간 순으로 정렬
+    def eta_sort_value(minutes):
+        return minutes if minutes is not None else 24 * 60
+    
+    students_with_schedule.sort(key=lambda row: (
+        row[1].pickup_time,
+        eta_sort_value(location_etas[(row[0].pickup_location, row[0].session_part)]),
+        row[0].pickup_location or '',
+        eta_sort_value(student_etas[row[0].id]),
+        row[0].name
+    ))
     
     # 시간 순서대로 그룹화 (승차/하차 구분)
     time_groups = {}
@@ -105,13 +412,13 @@ def today():
             time_groups[time_key][location_key] = []
         
         # 오늘 출석 정보 조회
-        attendance = Attendance.query.filter_by(
+        attendance = scoped(Attendance).filter_by(
             student_id=student.id,
             date=today_date
         ).first()
         
         # 요청 확인 (승인된 것과 대기 중인 것 모두)
-        active_request = Request.query.filter_by(
+        active_request = scoped(Request).filter_by(
             student_id=student.id
         ).filter(
             Request.start_date <= today_date,
@@ -120,18 +427,22 @@ def today():
             Request.status.in_(['approved', 'pending'])
         ).first()
         
+        student_eta = student_etas[student.id]
+        location_eta = location_etas[(student.pickup_location, student.session_part)]
         time_groups[time_key][location_key].append({
             'student': student,
             'schedule': schedule,
             'attendance': attendance,
-            'request': active_request
+            'request': active_request,
+            'eta': format_12h(student_eta) if student_eta is not None else None,
+            'location_eta': format_12h(location_eta) if location_eta is not None else None
         })
     
     return render_template('today.html', time_groups=time_groups, today=today_date)
 
 @app.route('/parent/absence')
 def parent_absence():
-    students = Student.query.order_by(Student.name).all()
+    students = scoped(Student).order_by(Student.name).all()
     return render_template('parent_absence.html', students=students)
 
 @app.route('/parent/absence', methods=['POST'])
@@ -144,7 +455,11 @@ def submit_request():
     end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else None
     memo = request.form.get('memo', '')
     
+    if not scoped(Student).filter_by(id=student_id).first():
+        abort(404)
+    
     new_request = Request(
+        dojo_id=g.dojo_id,
         student_id=student_id,
         request_type=request_type,
         reason=reason,
@@ -165,7 +480,9 @@ def admin_schedule_manager():
     schedule_data = {}
     
     # 모든 스케줄 조회
-    schedules = db.session.query(Student, Schedule).join(Schedule).order_by(
+    schedules = db.session.query(Student, Schedule).join(Schedule).filter(
+        Schedule.dojo_id == g.dojo_id
+    ).order_by(
         Schedule.day_of_week, Schedule.pickup_time, Student.pickup_location, Student.name
     ).all()
     
@@ -196,7 +513,7 @@ def admin_schedule_manager():
 
 @app.route('/admin/students')
 def admin_students():
-    students = Student.query.order_by(Student.name).all()
+    students = scoped(Student).order_by(Student.name).all()
     return render_template('admin_students.html', students=students)
 
 @app.route('/api/update_attendance', methods=['POST'])
@@ -206,14 +523,19 @@ def update_attendance():
     attendance_date = datetime.strptime(data.get('date'), '%Y-%m-%d').date()
     status = data.get('status')
     attendance_type = data.get('type', 'pickup')  # pickup or dropoff
+    now = local_now()
     
-    attendance = Attendance.query.filter_by(
+    student = scoped(Student).filter_by(id=student_id).first()
+    if not student:
+        return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'})
+    
+    attendance = scoped(Attendance).filter_by(
         student_id=student_id,
         date=attendance_date
     ).first()
     
     if not attendance:
-        attendance = Attendance(student_id=student_id, date=attendance_date)
+        attendance = Attendance(dojo_id=g.dojo_id, student_id=student_id, date=attendance_date)
         db.session.add(attendance)
     
     if attendance_type == 'pickup':
@@ -230,15 +552,29 @@ def update_attendance():
                 attendance.pickup_status = 'absent'   # 대기/탑승 → 결석
         else:
             attendance.pickup_status = status
+        
+        # 실제 탑승 시각은 당일 체크만 기록 (지난 날짜는 취소/재탑승해도 기존 시각 유지)
+        if attendance_date == now.date():
+            attendance.pickup_time = now.time().replace(microsecond=0) if attendance.pickup_status == 'boarded' else None
+        bump_eta_version(g.dojo_id)
     else:
         attendance.dropoff_status = status
+        if attendance_date == now.date():
+            attendance.dropoff_time = now.time().replace(microsecond=0) if status == 'dropped' else None
     
     db.session.commit()
+    
+    if attendance_type == 'pickup':
+        eta_engine = get_eta_engine(g.dojo_id)
+        if eta_engine.apply(dojo_eta_version(g.dojo_id)):
+            boarded_time = attendance.pickup_time if attendance.pickup_status == 'boarded' else None
+            eta_engine.record(student, attendance_date, boarded_time)
+    
     return jsonify({'success': True})
 
 @app.route('/api/approve_request/<int:request_id>', methods=['POST'])
 def approve_request_api(request_id):
-    req = Request.query.get_or_404(request_id)
+    req = scoped(Request).filter_by(id=request_id).first_or_404()
     req.status = 'approved'
     db.session.commit()
     return jsonify({'success': True})
@@ -246,7 +582,7 @@ def approve_request_api(request_id):
 @app.route('/admin/locations')
 def admin_locations():
     # 장소별로 학생들을 그룹화
-    students = Student.query.all()
+    students = scoped(Student).all()
     location_groups = {}
     
     for student in students:
@@ -268,7 +604,7 @@ def add_location():
             return jsonify({'success': False, 'message': '장소명이 필요합니다.'})
         
         # 중복 체크
-        existing_students = Student.query.filter_by(pickup_location=name).first()
+        existing_students = scoped(Student).filter_by(pickup_location=name).first()
         if existing_students:
             return jsonify({'success': False, 'message': '이미 존재하는 장소입니다.'})
         
@@ -288,13 +624,15 @@ def update_location():
             return jsonify({'success': False, 'message': '장소명이 필요합니다.'})
         
         # 해당 장소의 모든 학생들 업데이트
-        students = Student.query.filter_by(pickup_location=original_name).all()
+        students = scoped(Student).filter_by(pickup_location=original_name).all()
         for student in students:
             student.pickup_location = new_name
             if default_time:
                 student.estimated_pickup_time = default_time
         
+        bump_eta_version(g.dojo_id)
         db.session.commit()
+        get_eta_engine(g.dojo_id).reset()  # 장소/부 변경으로 예상 시간 재계산
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
@@ -310,12 +648,14 @@ def delete_location():
             return jsonify({'success': False, 'message': '장소명이 필요합니다.'})
         
         # 해당 장소의 모든 학생들의 장소 정보 초기화
-        students = Student.query.filter_by(pickup_location=location_name).all()
+        students = scoped(Student).filter_by(pickup_location=location_name).all()
         for student in students:
             student.pickup_location = None
             student.estimated_pickup_time = None
         
+        bump_eta_version(g.dojo_id)
         db.session.commit()
+        get_eta_engine(g.dojo_id).reset()  # 장소/부 변경으로 예상 시간 재계산
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
@@ -324,7 +664,7 @@ def delete_location():
 @app.route('/api/get_student/<int:student_id>')
 def get_student(student_id):
     try:
-        student = Student.query.get(student_id)
+        student = scoped(Student).filter_by(id=student_id).first()
         if not student:
             return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'})
         
@@ -353,7 +693,7 @@ def update_student_location():
         session_part = data.get('session_part')
         memo = data.get('memo')
         
-        student = Student.query.get(student_id)
+        student = scoped(Student).filter_by(id=student_id).first()
         if not student:
             return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'})
         
@@ -364,7 +704,9 @@ def update_student_location():
         student.session_part = int(session_part) if session_part else 1
         student.memo = memo if memo else None
         
+        bump_eta_version(g.dojo_id)
         db.session.commit()
+        get_eta_engine(g.dojo_id).reset()  # 장소/부 변경으로 예상 시간 재계산
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
@@ -375,6 +717,7 @@ def get_locations():
     try:
         # 현재 사용 중인 모든 장소 목록 반환
         locations = db.session.query(Student.pickup_location).filter(
+            Student.dojo_id == g.dojo_id,
             Student.pickup_location.isnot(None)
         ).distinct().all()
         
@@ -395,6 +738,7 @@ def add_student():
         
         # 새 학생 추가 (간단한 정보만)
         new_student = Student(
+            dojo_id=g.dojo_id,
             name=name,
             grade=birth_year  # grade 필드를 출생년도로 사용
         )
@@ -415,7 +759,7 @@ def check_duplicate_name():
         name = data.get('name')
         exclude_id = data.get('exclude_id')
         
-        query = Student.query.filter_by(name=name)
+        query = scoped(Student).filter_by(name=name)
         if exclude_id:
             query = query.filter(Student.id != exclude_id)
         
@@ -437,7 +781,7 @@ def update_student():
         name = data.get('name')
         birth_year = data.get('birth_year')
         
-        student = Student.query.get(student_id)
+        student = scoped(Student).filter_by(id=student_id).first()
         if not student:
             return jsonify({'success': False, 'error': '학생을 찾을 수 없습니다.'})
         
@@ -458,18 +802,23 @@ def delete_student():
         data = request.get_json()
         student_id = data.get('id')
         
-        student = Student.query.get(student_id)
+        student = scoped(Student).filter_by(id=student_id).first()
         if not student:
             return jsonify({'success': False, 'error': '학생을 찾을 수 없습니다.'})
         
         # 관련된 스케줄, 요청, 출석 정보도 함께 삭제
-        Schedule.query.filter_by(student_id=student_id).delete()
-        Request.query.filter_by(student_id=student_id).delete()
-        Attendance.query.filter_by(student_id=student_id).delete()
+        scoped(Schedule).filter_by(student_id=student_id).delete()
+        scoped(Request).filter_by(student_id=student_id).delete()
+        scoped(Attendance).filter_by(student_id=student_id).delete()
         
         db.session.delete(student)
+        bump_eta_version(g.dojo_id)
         db.session.commit()
         
+        eta_engine = get_eta_engine(g.dojo_id)
+        if eta_engine.apply(dojo_eta_version(g.dojo_id)):
+            eta_engine.forget(student.id)
+        
         return jsonify({'success': True})
     
     except Exception as e:
@@ -480,7 +829,7 @@ def delete_student():
 @app.route('/api/get_all_students')
 def get_all_students():
     try:
-        students = Student.query.order_by(Student.name).all()
+        students = scoped(Student).order_by(Student.name).all()
         return jsonify({
             'success': True,
             'students': [{
@@ -503,7 +852,7 @@ def add_student_to_schedule():
         target_location = data.get('location')  # 장소 정보
         
         # 학생 정보 확인
-        student = Student.query.get(student_id)
+        student = scoped(Student).filter_by(id=student_id).first()
         if not student:
             return jsonify({'success': False, 'error': '학생을 찾을 수 없습니다.'})
         
@@ -534,6 +883,7 @@ def add_student_to_schedule():
         
         # 새 스케줄 추가
         new_schedule = Schedule(
+            dojo_id=g.dojo_id,
             student_id=student_id,
             day_of_week=day_of_week,
             pickup_time=pickup_time,
@@ -541,7 +891,9 @@ def add_student_to_schedule():
         )
         
         db.session.add(new_schedule)
+        bump_eta_version(g.dojo_id)
         db.session.commit()
+        get_eta_engine(g.dojo_id).reset()  # 장소/부 변경으로 예상 시간 재계산
         
         return jsonify({'success': True})
     
@@ -558,11 +910,13 @@ def update_location_name():
         new_name = data.get('new_name')
         
         # 해당 장소의 모든 학생들 업데이트
-        students = Student.query.filter_by(pickup_location=old_name).all()
+        students = scoped(Student).filter_by(pickup_location=old_name).all()
         for student in students:
             student.pickup_location = new_name
         
+        bump_eta_version(g.dojo_id)
         db.session.commit()
+        get_eta_engine(g.dojo_id).reset()  # 장소/부 변경으로 예상 시간 재계산
         return jsonify({'success': True})
     
     except Exception as e:
@@ -580,7 +934,7 @@ def remove_student_from_schedule():
         schedule_type = data.get('type', 'pickup')  # pickup 또는 dropoff
         
         # 특정 조건의 스케줄만 삭제 (개별 삭제)
-        query = Schedule.query.filter_by(
+        query = scoped(Schedule).filter_by(
             student_id=student_id,
             day_of_week=day_of_week
         )
@@ -605,6 +959,43 @@ def remove_student_from_schedule():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
+# 도장 추가 명령 (flask create-dojo <slug> <이름>)
+@app.cli.command('create-dojo')
+@click.argument('slug')
+@click.argument('name')
+def create_dojo(slug, name):
+    if Dojo.query.filter_by(slug=slug).first():
+        click.echo(f"이미 존재하는 도장입니다: {slug}")
+        return
+    db.session.add(Dojo(slug=slug, name=name))
+    db.session.commit()
+    click.echo(f"도장이 추가되었습니다: {slug}")
+
+def migrate_dojo_table():
+    # eta_version 도입 전 dojo 테이블에 컬럼 추가 (Dojo 조회 전에 실행)
+    columns = [column['name'] for column in db.inspect(db.engine).get_columns('dojo')]
+    if 'eta_version' not in columns:
+        with db.engine.begin() as connection:
+            connection.execute(db.text('ALTER TABLE dojo ADD COLUMN eta_version INTEGER NOT NULL DEFAULT 0'))
+
+def migrate_dojo_columns(default_dojo):
+    # 도장 기능 도입 전 테이블에 dojo_id 컬럼을 추가하고 기본 도장으로 채움
+    inspector = db.inspect(db.engine)
+    for model in (Student, Schedule, Request, Attendance):
+        table = model.__tablename__
+        columns = [column['name'] for column in inspector.get_columns(table)]
+        if 'dojo_id' in columns:
+            continue
+        
+        with db.engine.begin() as connection:
+            connection.execute(db.text(f'ALTER TABLE {table} ADD COLUMN dojo_id INTEGER REFERENCES dojo(id)'))
+            connection.execute(db.text(f'UPDATE {table} SET dojo_id = :dojo_id'), {'dojo_id': default_dojo.id})
+            # SQLite는 ALTER COLUMN을 지원하지 않아 nullable로 남음 (개발용 DB는 매번 재생성)
+            if db.engine.dialect.name == 'postgresql':
+                connection.execute(db.text(f'ALTER TABLE {table} ALTER COLUMN dojo_id SET NOT NULL'))
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
 # 앱 초기화 함수
 def init_db():
     import os
@@ -616,9 +1007,18 @@ def init_db():
             db.drop_all()
             db.create_all()
         
+        # 기본 도장 생성 및 기존 데이터 이전
+        migrate_dojo_table()
+        default_dojo = Dojo.query.filter_by(slug=app.config['DEFAULT_DOJO']).first()
+        if not default_dojo:
+            default_dojo = Dojo(slug=app.config['DEFAULT_DOJO'], name='본관')
+            db.session.add(default_dojo)
+            db.session.commit()
+        migrate_dojo_columns(default_dojo)
+        
         # 샘플 데이터 추가 (처음 실행시에만)
         try:
-            if Student.query.count() == 0:
+            if Student.query.filter_by(dojo_id=default_dojo.id).count() == 0:
                 # 실제 시간표 기반 샘플 학생 데이터
                 students_data = [
                     # 1부 (2:00~2:50)
@@ -645,13 +1045,13 @@ def init_db():
                 ]
                 
                 for student_data in students_data:
-                    student = Student(**student_data)
+                    student = Student(dojo_id=default_dojo.id, **student_data)
                     db.session.add(student)
                 
                 db.session.commit()
                 
                 # 샘플 스케줄 데이터 (월요일, 수요일, 금요일)
-                students = Student.query.all()
+                students = Student.query.filter_by(dojo_id=default_dojo.id).all()
                 for student in students:
                     for day in [0, 2, 4]:  # 월, 수, 금
                         # 부별 시간 설정
@@ -672,6 +1072,7 @@ def init_db():
                             dropoff_time_obj = time(19, 50)  # 7:50 PM
                         
                         schedule = Schedule(
+                            dojo_id=default_dojo.id,
                             student_id=student.id,
                             day_of_week=day,
                             pickup_time=pickup_time_obj,
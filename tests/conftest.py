@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# app.py는 import 시 init_db()를 실행하므로 먼저 테스트용 DB를 지정
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
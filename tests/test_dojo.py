@@ -0,0 +1,149 @@
+import re
+from datetime import time, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import app as tkd
+from app import db, Dojo, Student, Schedule, Attendance
+
+TENANT_TABLES = ('student', 'schedule', 'request', 'attendance')
+BIG_STUDENTS = 5000
+
+
+@pytest.fixture(scope='module')
+def dojos():
+    # 큰 도장 하나와 작은 도장 하나를 준비
+    weekday = tkd.local_now().date().weekday()
+    with tkd.app.app_context():
+        small = Dojo(slug='small', name='작은 도장')
+        big = Dojo(slug='big', name='큰 도장')
+        db.session.add_all([small, big])
+        db.session.commit()
+        
+        for i in range(5):
+            student = Student(dojo_id=small.id, name=f'작은{i}', pickup_location='정문', session_part=1)
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(Schedule(dojo_id=small.id, student_id=student.id, day_of_week=weekday,
+                                    pickup_time=time(14, 0), dropoff_time=time(14, 50)))
+        
+        db.session.bulk_insert_mappings(Student, [
+            {'dojo_id': big.id, 'name': f'큰{i}', 'pickup_location': f'장소{i % 50}', 'session_part': i % 5 + 1}
+            for i in range(BIG_STUDENTS)
+        ])
+        db.session.commit()
+        
+        big_ids = [student_id for (student_id,) in db.session.query(Student.id).filter_by(dojo_id=big.id)]
+        today_date = tkd.local_now().date()
+        db.session.bulk_insert_mappings(Schedule, [
+            {'dojo_id': big.id, 'student_id': student_id, 'day_of_week': day,
+             'pickup_time': time(14, 0), 'dropoff_time': time(14, 50)}
+            for student_id in big_ids for day in range(7)
+        ])
+        db.session.bulk_insert_mappings(Attendance, [
+            {'dojo_id': big.id, 'student_id': student_id, 'date': today_date - timedelta(days=days_ago),
+             'pickup_status': 'boarded', 'pickup_time': time(14, 30)}
+            for student_id in big_ids for days_ago in range(1, 11)
+        ])
+        db.session.commit()
+        
+        yield {'small': small.id, 'big': big.id}
+
+
+def query_plans(client, url):
+    # 요청 중 실행된 쿼리를 모아 EXPLAIN QUERY PLAN 결과를 반환
+    statements = []
+    
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+    
+    with tkd.app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert response.status_code == 200
+    
+    plans = []
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            plans.append((statement, [row[-1] for row in rows]))
+    return response, plans
+
+
+def assert_no_tenant_table_scan(plans):
+    for statement, details in plans:
+        for detail in details:
+            match = re.match(r'SCAN (\w+)', detail)
+            assert not (match and match.group(1) in TENANT_TABLES), f'{detail}\n{statement}'
+
+
+def test_small_dojo_today_uses_tenant_indexes(dojos):
+    client = tkd.app.test_client()
+    response, plans = query_plans(client, '/d/small/today')
+    
+    assert '작은0' in response.data.decode()
+    assert_no_tenant_table_scan(plans)
+    details = ' '.join(detail for _, plan in plans for detail in plan)
+    assert 'ix_schedule_dojo_day' in details
+    assert 'ix_attendance_dojo_' in details
+
+
+def test_small_dojo_students_use_tenant_indexes(dojos):
+    client = tkd.app.test_client()
+    response, plans = query_plans(client, '/d/small/api/get_all_students')
+    
+    assert len(response.get_json()['students']) == 5
+    assert_no_tenant_table_scan(plans)
+    assert any('ix_student_dojo_name' in detail for _, plan in plans for detail in plan)
+
+
+def test_post_without_prefix_ignores_session_dojo(dojos):
+    client = tkd.app.test_client()
+    client.get('/d/small/admin/students')
+    client.get('/d/big/today')
+    
+    assert client.post('/d/small/api/add_student', data={'name': '작은도장신입'}).get_json()['success']
+    assert client.post('/api/add_student', data={'name': '경로없는신입'}).get_json()['success']
+    
+    with tkd.app.app_context():
+        assert Student.query.filter_by(name='작은도장신입').one().dojo_id == dojos['small']
+        default_dojo = Dojo.query.filter_by(slug=tkd.app.config['DEFAULT_DOJO']).one()
+        assert Student.query.filter_by(name='경로없는신입').one().dojo_id == default_dojo.id
+
+
+def test_bare_get_redirects_so_page_and_writes_share_a_dojo(dojos):
+    client = tkd.app.test_client()
+    client.get('/d/small/today')
+    
+    response = client.get('/admin/students?tab=1')
+    assert response.status_code == 302
+    assert response.headers['Location'] == '/d/small/admin/students?tab=1'
+    
+    page = client.get(response.headers['Location']).data.decode()
+    base_path = re.search(r'const BASE_PATH = "([^"]*)";', page).group(1)
+    assert base_path == '/d/small'
+    
+    assert client.post(base_path + '/api/add_student', data={'name': '화면과같은도장'}).get_json()['success']
+    with tkd.app.app_context():
+        student = Student.query.filter_by(name='화면과같은도장').one()
+        assert student.dojo_id == dojos['small']
+    
+    # 탑승 체크도 화면에 보인 학생 그대로 처리됨
+    tap = client.post(base_path + '/api/update_attendance', json={
+        'student_id': student.id, 'date': str(tkd.local_now().date()), 'status': 'boarded', 'type': 'pickup'
+    })
+    assert tap.get_json() == {'success': True}
+
+
+def test_bare_get_without_session_uses_default_dojo(dojos):
+    client = tkd.app.test_client()
+    assert client.get('/admin/students').status_code == 200
+    
+    client.get('/d/nope/today')
+    assert client.get('/today').status_code == 200
@@ -0,0 +1,187 @@
+from datetime import date, datetime, time, timedelta
+from statistics import median
+from types import SimpleNamespace
+
+import pytest
+
+import app as tkd
+from app import db, Dojo, Student, Schedule, Attendance, PickupEtaEngine, ETA_WINDOW
+
+MONDAY = date(2026, 10, 19)
+NOW = datetime(2026, 10, 19, 14, 10, 30)
+
+
+def make_student(student_id, location=None, part=1, estimated=None):
+    return SimpleNamespace(id=student_id, pickup_location=location, session_part=part,
+                           estimated_pickup_time=estimated)
+
+
+def loaded_engine():
+    engine = PickupEtaEngine(dojo_id=0)
+    engine.loaded_on = MONDAY
+    engine.version = 0
+    return engine
+
+
+def mondays_ago(weeks):
+    return MONDAY - timedelta(weeks=weeks)
+
+
+def test_12h_time_helpers():
+    assert tkd.parse_12h_time('2:40') == 14 * 60 + 40
+    assert tkd.parse_12h_time('12:05') == 12 * 60 + 5
+    assert tkd.parse_12h_time('모름') is None
+    assert tkd.parse_12h_time(None) is None
+    assert tkd.format_12h(14 * 60 + 40) == '2:40'
+    assert tkd.format_12h(12 * 60 + 5) == '12:05'
+    assert tkd.format_12h(14 * 60 + 40.5) == '2:40'
+
+
+def test_student_median_uses_recent_window_and_min_samples():
+    engine = loaded_engine()
+    student = make_student(1)
+    
+    engine.record(student, mondays_ago(1), time(14, 0))
+    assert engine.predict_student(student, 0) is None  # 기록 1개는 부족
+    
+    engine.record(student, mondays_ago(2), time(14, 10))
+    assert engine.predict_student(student, 0) == 14 * 60 + 5
+    
+    # 오래된 기록은 최근 ETA_WINDOW 날짜에서 밀려남
+    for weeks in range(3, ETA_WINDOW + 3):
+        engine.record(student, mondays_ago(weeks), time(15, 0))
+    engine.record(student, mondays_ago(0), time(14, 20))
+    recent = [14 * 60 + 20, 14 * 60 + 0, 14 * 60 + 10] + [15 * 60] * (ETA_WINDOW - 3)
+    assert engine.predict_student(student, 0) == median(recent)
+
+
+def test_prediction_falls_back_from_student_to_location_to_hand_typed():
+    engine = loaded_engine()
+    veteran = make_student(1, location='정문', estimated='3:00')
+    newcomer = make_student(2, location='정문', estimated='3:00')
+    unknown = make_student(3, location='후문', estimated='3:30')
+    
+    engine.record(veteran, mondays_ago(1), time(14, 40))
+    engine.record(veteran, mondays_ago(2), time(14, 42))
+    
+    assert engine.predict_student(veteran, 0) == 14 * 60 + 41  # 학생 기록
+    assert engine.predict_student(newcomer, 0) == 14 * 60 + 41  # 장소 기록
+    assert engine.predict_student(unknown, 0) == 15 * 60 + 30  # 수기 입력
+    assert engine.predict_student(make_student(4), 0) is None
+    assert engine.predict_location('정문', 0, 1) == 14 * 60 + 41
+    assert engine.predict_location('정문', 2, 1) is None
+
+
+def test_record_removes_sample_when_boarding_is_undone():
+    engine = loaded_engine()
+    student = make_student(1, location='정문')
+    engine.record(student, mondays_ago(1), time(14, 40))
+    engine.record(student, mondays_ago(0), time(14, 50))
+    assert engine.predict_location('정문', 0, 1) == 14 * 60 + 45
+    
+    engine.record(student, mondays_ago(0), None)
+    assert engine.predict_location('정문', 0, 1) == 14 * 60 + 40
+    assert engine.student_samples[(student.id, 0, 1)] == {mondays_ago(1): 14 * 60 + 40}
+
+
+def test_record_is_ignored_before_first_load():
+    engine = PickupEtaEngine(dojo_id=0)
+    engine.record(make_student(1, location='정문'), mondays_ago(1), time(14, 40))
+    assert engine.student_samples == {}
+
+
+def test_forget_and_reset():
+    engine = loaded_engine()
+    leaving = make_student(1, location='정문')
+    staying = make_student(2, location='정문')
+    engine.record(leaving, mondays_ago(1), time(14, 0))
+    engine.record(staying, mondays_ago(1), time(14, 30))
+    assert engine.predict_location('정문', 0, 1) == 14 * 60 + 15
+    
+    engine.forget(leaving.id)
+    assert engine.predict_location('정문', 0, 1) == 14 * 60 + 30
+    assert not any(key[0] == leaving.id for key in engine.student_samples)
+    
+    engine.reset()
+    assert engine.loaded_on is None
+    assert engine.predict_location('정문', 0, 1) is None
+
+
+def test_apply_only_keeps_cache_for_next_version():
+    engine = loaded_engine()
+    assert engine.apply(1)
+    assert engine.version == 1
+    
+    assert not engine.apply(3)  # 다른 워커의 변경이 끼어듦 → 다시 로딩
+    assert engine.loaded_on is None
+
+
+@pytest.fixture
+def eta_dojo(monkeypatch):
+    monkeypatch.setattr(tkd, 'local_now', lambda: NOW)
+    with tkd.app.app_context():
+        dojo = Dojo(slug='eta', name='ETA 도장')
+        db.session.add(dojo)
+        db.session.commit()
+        yield dojo.id
+        for model in (Attendance, Schedule, Student):
+            model.query.filter_by(dojo_id=dojo.id).delete()
+        Dojo.query.filter_by(id=dojo.id).delete()
+        db.session.commit()
+        tkd.eta_engines.pop(dojo.id, None)
+
+
+def add_student(dojo_id, name, location, history=()):
+    student = Student(dojo_id=dojo_id, name=name, pickup_location=location, session_part=1)
+    db.session.add(student)
+    db.session.flush()
+    db.session.add(Schedule(dojo_id=dojo_id, student_id=student.id, day_of_week=MONDAY.weekday(),
+                            pickup_time=time(14, 0), dropoff_time=time(14, 50)))
+    for weeks, pickup_time in enumerate(history, start=1):
+        db.session.add(Attendance(dojo_id=dojo_id, student_id=student.id, date=mondays_ago(weeks),
+                                  pickup_status='boarded', pickup_time=pickup_time))
+    db.session.commit()
+    return student.id
+
+
+def board(client, student_id, attendance_date):
+    return client.post('/d/eta/api/update_attendance', json={
+        'student_id': student_id, 'date': str(attendance_date), 'status': 'boarded', 'type': 'pickup'
+    }).get_json()
+
+
+def test_boarding_is_stamped_in_local_time_for_today_only(eta_dojo):
+    student_id = add_student(eta_dojo, '에타학생', '정문')
+    past_day = mondays_ago(1)
+    db.session.add(Attendance(dojo_id=eta_dojo, student_id=student_id, date=past_day,
+                              pickup_status='boarded', pickup_time=time(14, 33)))
+    db.session.commit()
+    client = tkd.app.test_client()
+    
+    assert board(client, student_id, MONDAY)['success']
+    assert Attendance.query.filter_by(student_id=student_id, date=MONDAY).one().pickup_time == time(14, 10, 30)
+    
+    # 지난 날짜는 취소 후 다시 탑승해도 기존 시각 유지
+    board(client, student_id, past_day)
+    attendance = Attendance.query.filter_by(student_id=student_id, date=past_day).one()
+    assert (attendance.pickup_status, attendance.pickup_time) == ('pending', time(14, 33))
+    board(client, student_id, past_day)
+    db.session.refresh(attendance)
+    assert (attendance.pickup_status, attendance.pickup_time) == ('boarded', time(14, 33))
+    
+    # 기록이 없던 지난 날짜는 현재 시각을 찍지 않음
+    board(client, student_id, mondays_ago(2))
+    assert Attendance.query.filter_by(student_id=student_id, date=mondays_ago(2)).one().pickup_time is None
+    
+    # 당일 탑승 취소는 시각 삭제
+    board(client, student_id, MONDAY)
+    assert Attendance.query.filter_by(student_id=student_id, date=MONDAY).one().pickup_time is None
+
+
+def test_today_orders_locations_by_predicted_time(eta_dojo):
+    add_student(eta_dojo, '가장소학생', '가장소', [time(14, 50), time(14, 52)])
+    add_student(eta_dojo, '나장소학생', '나장소', [time(14, 20), time(14, 22)])
+    
+    html = tkd.app.test_client().get('/d/eta/today').data.decode()
+    assert html.index('나장소학생') < html.index('가장소학생')
+    assert '2:21' in html and '2:51' in html